@@ -1,46 +1,41 @@
-import configparser
-import importlib.resources
-from importlib.metadata import version
-from pathlib import Path
+from typing import Optional
 
 import click
 
 from . import pretty
-from .pulse import PulseInterface, LoadInfo
-from .pulse.exceptions import *
-
-CONFIG_FILE_PATH = Path.home() / ".config" / "rnnoise_cli" / "rnnoise_cli.conf"
-
-CONFIG_DEFAULTS = {
-    "activate": {
-        # "device": omitted,
-        "control": "50"
-    }
-}
+from ._version import __version__
+from .config import DictConfig, load_config
 
 
 class CtxData:
-    def __init__(self, config: configparser.ConfigParser, verbose: bool):
-        self.config = config
+    __slots__ = ("verbose", "_config")
+
+    def __init__(self, verbose: bool):
         self.verbose = verbose
+        self._config: Optional[DictConfig] = None
+
+    @property
+    def config(self) -> DictConfig:
+        """
+        The user config, only read from disk on first access.
+        Defaults are passed as fallbacks where options are read.
+        """
+        if self._config is None:
+            self._config = load_config()
+        return self._config
 
 
 @click.group()
-@click.version_option(version=version("rnnoise-cli"))
+@click.version_option(version=__version__)
 @click.option("--verbose", "-v", is_flag=True,
               help="Print more.")
 @click.pass_context
 def rnnoise(ctx: click.Context, verbose: bool):
-    config = configparser.ConfigParser()
-    # load defaults
-    config.read_dict(CONFIG_DEFAULTS)
-    # load actual config
-    config.read(CONFIG_FILE_PATH)
-    ctx.obj = CtxData(config, verbose)
+    ctx.obj = CtxData(verbose)
 
 
 def prompt_device_pretty() -> str:
-    click.echo(pretty.list_devices(PulseInterface.get_input_devices()))
+    from .pulse import PulseInterface
     return click.prompt(
         pretty.DEVICE_PROMPT,
         default=PulseInterface.get_default_input_device().index,
@@ -48,12 +43,14 @@ def prompt_device_pretty() -> str:
     )
 
 
-def obtain_device(activate_config: configparser.SectionProxy, device_str: str, prompt: bool):
+def obtain_device(config: DictConfig, device_str: str, prompt: bool):
+    from .pulse import PulseInterface
     if device_str is None:
-        device_str = activate_config.get("device", None)
+        device_str = config.get("activate", "device", fallback=None)
     device = None if device_str is None else PulseInterface.get_source(device_str)
     if device is None:
         if prompt:
+            click.echo(pretty.list_devices(PulseInterface.get_input_devices()))
             while True:
                 device_str = prompt_device_pretty()
                 device = PulseInterface.get_source(device_str)
@@ -67,40 +64,55 @@ def obtain_device(activate_config: configparser.SectionProxy, device_str: str, p
         return device
 
 
+# Latencies accepted by module-loopback, in milliseconds
+LATENCY_RANGE = click.IntRange(1, 30000)
+
+
 @rnnoise.command()
 @click.option("--device", "-d", "device_str", type=str,
               help="Input device name or number (see `rnnoise list`). Default: default input device.")
 @click.option("--control", "-c", type=int,
               help="Control level between 0 and 100. Default: 50.")
+@click.option("--latency", "-l", type=LATENCY_RANGE,
+              help="Latency of the loopback from the input device to the plugin in milliseconds, "
+                   "between 1 and 30000. Default: 10.")
 @click.option("--prompt/--no-prompt", default=True,
               help="When no device is configured or given, prompt or use default device immediately?")
 @click.option("--set-default/--no-set-default", default=True,
               help="Set the new RNNoise device as default device.")
 @click.pass_obj
-def activate(ctx: CtxData, device_str: str, control: int, prompt: bool, set_default: bool):
+def activate(ctx: CtxData, device_str: str, control: int, latency: int, prompt: bool, set_default: bool):
     """
     Activate the noise suppression plugin.
     """
+    from .pulse import DEFAULT_LATENCY_MSEC, PulseInterface
+    from .pulse.exceptions import NoCacheDirectoryException
     if PulseInterface.rnn_is_loaded():
         if not click.confirm(pretty.ALREADY_LOADED_CONFIRM):
             return
 
-    activate_config = ctx.config["activate"]
     if control is None:
-        control = activate_config.getint("control", None)
+        control = ctx.config.getint("activate", "control", fallback=50)
+    if latency is None:
+        latency = ctx.config.getint("activate", "latency", fallback=DEFAULT_LATENCY_MSEC)
+        if not LATENCY_RANGE.min <= latency <= LATENCY_RANGE.max:
+            raise click.ClickException(f"Invalid latency in the config file: {latency}. "
+                                       f"It should be between {LATENCY_RANGE.min} and {LATENCY_RANGE.max}.")
 
-    device = obtain_device(activate_config, device_str, prompt)
+    device = obtain_device(ctx.config, device_str, prompt)
 
-    if control is None or not 0 <= control <= 100:
+    if not 0 <= control <= 100:
         control = 50
 
     if ctx.verbose:
-        click.echo(pretty.params(device, control))
+        click.echo(pretty.params(device, control, latency))
 
-    PulseInterface.load_modules(device, control, ctx.verbose, set_default)
-
-    if PulseInterface.rnn_is_loaded():
-        click.secho("Activated!", fg="green")
+    try:
+        PulseInterface.load_modules(device, control, ctx.verbose, set_default, latency)
+    except NoCacheDirectoryException as e:
+        click.secho(e.message, fg="red")
+        return
+    click.secho("Activated!", fg="green")
 
 
 @rnnoise.command()
@@ -114,6 +126,8 @@ def deactivate(ctx: CtxData, force_unload_all: bool, force: bool):
     """
     Deactivate the noise suppression plugin.
     """
+    from .pulse import PulseInterface
+    from .pulse.exceptions import RNNInUseException, NoLoadedModulesException
     if force_unload_all:
         PulseInterface.unload_modules_all()
     else:
@@ -142,7 +156,8 @@ def control_get():
     """
     Get control level.
     """
-    click.echo(LoadInfo.from_pickle().control)
+    from .pulse import LoadInfo
+    click.echo(LoadInfo.from_json().control)
 
 
 @control_.command(name="set")
@@ -156,13 +171,18 @@ def control_set(ctx: CtxData, control_level: int, force: bool, set_default: bool
     """
     Set control level.
     """
+    from .pulse import PulseInterface
+    from .pulse.exceptions import DeviceNotFoundException, NotActivatedException, RNNInUseException
     try:
-        PulseInterface.change_control_level(control_level, ctx.verbose, force, set_default)
+        try:
+            PulseInterface.change_control_level(control_level, ctx.verbose, force, set_default)
+        except RNNInUseException:
+            if click.confirm(pretty.STREAM_IN_USE_CONTROL_CONFIRM):
+                PulseInterface.change_control_level(control_level, ctx.verbose, True, set_default)
     except NotActivatedException:
         click.secho("Plugin is not activated, cannot change control level.", fg="red")
-    except RNNInUseException:
-        if click.confirm(pretty.STREAM_IN_USE_CONTROL_CONFIRM):
-            PulseInterface.change_control_level(control_level, ctx.verbose, True, set_default)
+    except DeviceNotFoundException as e:
+        click.secho(e.message, fg="red")
 
 
 @rnnoise.command(name="list")
@@ -170,7 +190,13 @@ def list_devices():
     """
     List available devices.
     """
-    click.echo(pretty.list_devices(PulseInterface.get_input_devices()))
+    from .pulse import PulseInterface
+    devices = PulseInterface.get_input_devices()
+    if len(devices) > pretty.LIST_PAGER_THRESHOLD:
+        # echo_via_pager adds the final newline itself
+        click.echo_via_pager(f"\n{row}" if i else row for i, row in enumerate(pretty.iter_device_rows(devices)))
+    else:
+        click.echo(pretty.list_devices(devices))
 
 
 @rnnoise.command(name="license")
@@ -178,9 +204,9 @@ def license_():
     """
     Show license info and exit.
     """
+    import importlib.resources
     notice = importlib.resources.read_text("rnnoise_cli.data", "license_info.txt")
     click.echo(notice)
-    exit()
 
 
 @rnnoise.command()
@@ -188,8 +214,8 @@ def status():
     """
     Show whether the LADSPA plugin is loaded.
     """
+    from .pulse import LoadInfo, PulseInterface
     if PulseInterface.rnn_is_loaded():
-        click.secho("The plugin is loaded.", fg="green")
-        click.secho(pretty.load_info(LoadInfo.from_pickle()))
+        click.echo(click.style("The plugin is loaded.", fg="green") + "\n" + pretty.load_info(LoadInfo.from_json()))
     else:
         click.secho("The plugin is not loaded.", fg="red")
@@ -0,0 +1,133 @@
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+
+def _absolute_path(path: Optional[str]) -> Optional[Path]:
+    """
+    Returns:
+        `path` if it is an absolute path, otherwise `None`.
+        Relative paths are ignored since they would depend on the working directory.
+    """
+    return Path(path) if path and os.path.isabs(path) else None
+
+
+def _xdg_dir(env_var: str, default_subdir: str) -> Optional[Path]:
+    """
+    Returns:
+        The directory in the XDG base directory environment variable `env_var` if it is an absolute path,
+        otherwise `default_subdir` in the home directory, or `None` if there is no home directory either.
+    """
+    xdg_dir = _absolute_path(os.environ.get(env_var))
+    if xdg_dir is None and HOME is not None:
+        xdg_dir = HOME / default_subdir
+    return xdg_dir
+
+
+# `expanduser` leaves "~" as is instead of raising when the home directory cannot be determined,
+# e.g. without `HOME` in a container or cron job.
+HOME = _absolute_path(os.path.expanduser("~"))
+_cache_home = _xdg_dir("XDG_CACHE_HOME", ".cache")
+# `None` if there is no usable cache directory, in which case nothing is cached or remembered.
+CACHE_PATH = None if _cache_home is None else _cache_home / "rnnoise_cli"
+# Parsed config, reused as long as the config file's modification time and size do not change.
+CONFIG_CACHE_PATH = None if CACHE_PATH is None else CACHE_PATH / "config.json"
+
+
+def config_file_path() -> Optional[Path]:
+    """
+    Returns:
+        `$XDG_CONFIG_HOME/rnnoise_cli/rnnoise_cli.conf`, where `XDG_CONFIG_HOME` defaults to `~/.config`.
+        `None` if neither is available.
+    """
+    config_home = _xdg_dir("XDG_CONFIG_HOME", ".config")
+    return None if config_home is None else config_home / "rnnoise_cli" / "rnnoise_cli.conf"
+
+
+class DictConfig:
+    """
+    The parsed config, with the `get`/`getint` interface of `configparser.ConfigParser`.
+    """
+
+    def __init__(self, sections: Dict[str, Dict[str, str]]):
+        """
+        Args:
+            sections:
+                Option values by option name, by section name.
+        """
+        self._sections = sections
+
+    def get(self, section: str, option: str, *, fallback: Optional[str] = None) -> Optional[str]:
+        return self._sections.get(section, {}).get(option, fallback)
+
+    def getint(self, section: str, option: str, *, fallback: Optional[int] = None) -> Optional[int]:
+        value = self.get(section, option)
+        return fallback if value is None else int(value)
+
+
+def _parse_config(config_path: Path) -> Dict[str, Dict[str, str]]:
+    import configparser
+    config = configparser.ConfigParser()
+    config.read(config_path)
+    return {name: dict(config[name]) for name in config.sections()}
+
+
+def _is_sections(sections) -> bool:
+    return isinstance(sections, dict) and all(
+        isinstance(options, dict) and all(isinstance(value, str) for value in options.values())
+        for options in sections.values()
+    )
+
+
+def _read_config_cache(config_path: Path, mtime_ns: int, size: int) -> Optional[Dict[str, Dict[str, str]]]:
+    """
+    Returns:
+        The cached sections if they were parsed from this version of the config file,
+        otherwise, or if the cache is invalid, `None`.
+    """
+    if CONFIG_CACHE_PATH is None:
+        return None
+    try:
+        cache = json.loads(CONFIG_CACHE_PATH.read_text())
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cache, dict) or cache.get("path") != str(config_path) \
+            or cache.get("mtime_ns") != mtime_ns or cache.get("size") != size:
+        return None
+    sections = cache.get("sections")
+    return sections if _is_sections(sections) else None
+
+
+def _write_config_cache(config_path: Path, mtime_ns: int, size: int, sections: Dict[str, Dict[str, str]]):
+    if CONFIG_CACHE_PATH is None:
+        return
+    try:
+        CONFIG_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        CONFIG_CACHE_PATH.write_text(json.dumps(
+            {"path": str(config_path), "mtime_ns": mtime_ns, "size": size, "sections": sections}))
+    except OSError:
+        # Not being able to cache only means parsing again next time.
+        pass
+
+
+def load_config() -> DictConfig:
+    """
+    Parsing is skipped if there is no config file,
+    or if its modification time and size did not change since it was cached in `CONFIG_CACHE_PATH`.
+    Returns:
+        The parsed config, empty if there is no config file.
+    """
+    config_path = config_file_path()
+    if config_path is None:
+        return DictConfig({})
+    try:
+        st = config_path.stat()
+    except OSError:
+        return DictConfig({})
+
+    sections = _read_config_cache(config_path, st.st_mtime_ns, st.st_size)
+    if sections is None:
+        sections = _parse_config(config_path)
+        _write_config_cache(config_path, st.st_mtime_ns, st.st_size, sections)
+    return DictConfig(sections)
@@ -1,10 +1,11 @@
-# ANSI escape sequences
-from typing import List
+from typing import Iterator, List, TYPE_CHECKING
 
-from pulsectl import PulseSourceInfo
+if TYPE_CHECKING:
+    from pulsectl import PulseSourceInfo
 
-from rnnoise_cli.pulse import LoadInfo
+    from rnnoise_cli.pulse import LoadInfo
 
+# ANSI escape sequences
 ANSI_COLOR_GREEN = "\u001b[32m"
 ANSI_COLOR_RED = "\u001b[31m"
 ANSI_COLOR_BLUE = "\u001b[34m"
@@ -25,26 +26,45 @@ NO_LOADED_MODULES = f"No loaded modules found (already deactivated?), " \
 STREAM_IN_USE_CONTROL_CONFIRM = f"{ANSI_COLOR_RED}The RNNoise input stream is in use, " \
                                 f"changing control level may cause applications to misbehave.{ANSI_STYLE_RESET}\n" \
                                 "Are you sure?"
+DEVICE_ROW = f"{{index_padding}}[{ANSI_COLOR_YELLOW}{{index}}{ANSI_STYLE_RESET}]  " \
+             f"{ANSI_COLOR_BLUE}{{name}}{ANSI_STYLE_RESET}{{name_padding}}  " \
+             "{description}"
+
+# `rnnoise list` pages its output when there are more devices than this
+LIST_PAGER_THRESHOLD = 40
+
+
+def iter_device_rows(devices: List['PulseSourceInfo']) -> Iterator[str]:
+    # Column widths are measured on the unstyled text, the ANSI escapes are added around the padded values.
+    rows = []
+    index_len = name_len = description_len = 0
+    for d in devices:
+        index = str(d.index)
+        rows.append((index, d.name, d.description))
+        index_len = max(index_len, len(index))
+        name_len = max(name_len, len(d.name))
+        description_len = max(description_len, len(d.description))
+    for index, name, description in rows:
+        yield DEVICE_ROW.format(
+            index_padding=" " * (index_len - len(index)),
+            index=index,
+            name=name,
+            name_padding=" " * (name_len - len(name)),
+            description=description.ljust(description_len)
+        )
 
 
-def list_devices(devices: List[PulseSourceInfo]):
-    device_strings = [(
-        f"[{ANSI_COLOR_YELLOW}{d.index}{ANSI_STYLE_RESET}]",
-        f"{ANSI_COLOR_BLUE}{d.name}{ANSI_STYLE_RESET}",
-        d.description
-    ) for d in devices]
-    column_lens: List[int] = []
-    for col in zip(*device_strings):
-        column_lens.append(max(len(val) for val in col))
-    fmt = f"{{:>{column_lens[0]}}}  {{:<{column_lens[1]}}}  {{:<{column_lens[2]}}}"
-    return "\n".join(fmt.format(*s) for s in device_strings)
+def list_devices(devices: List['PulseSourceInfo']):
+    return "\n".join(iter_device_rows(devices))
 
 
-def params(device: PulseSourceInfo, control: int):
+def params(device: 'PulseSourceInfo', control: int, latency_msec: int):
     return f"\t{ANSI_UNDERLINE}Device{ANSI_STYLE_RESET}:         {device.name}\n" \
-           f"\t{ANSI_UNDERLINE}Control level{ANSI_STYLE_RESET}:  {control}"
+           f"\t{ANSI_UNDERLINE}Control level{ANSI_STYLE_RESET}:  {control}\n" \
+           f"\t{ANSI_UNDERLINE}Latency{ANSI_STYLE_RESET}:        {latency_msec} ms"
 
 
-def load_info(info: LoadInfo):
-    return f"{ANSI_UNDERLINE}Device{ANSI_STYLE_RESET}:   {info.device.name}\n" \
-           f"{ANSI_UNDERLINE}Control{ANSI_STYLE_RESET}:  {info.control}"
+def load_info(info: 'LoadInfo'):
+    return f"{ANSI_UNDERLINE}Device{ANSI_STYLE_RESET}:   {info.device_name}\n" \
+           f"{ANSI_UNDERLINE}Control{ANSI_STYLE_RESET}:  {info.control}\n" \
+           f"{ANSI_UNDERLINE}Latency{ANSI_STYLE_RESET}:  {info.latency_msec} ms"
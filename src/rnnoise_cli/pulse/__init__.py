@@ -1 +1 @@
-from .pulse import *
+from .pulse import DEFAULT_LATENCY_MSEC, LoadInfo, PulseInterface
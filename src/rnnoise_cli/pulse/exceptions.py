@@ -17,3 +17,14 @@ class NoLoadedModulesException(PulseInterfaceException):
 class RNNInUseException(PulseInterfaceException):
     def __init__(self, message: str = "The plugin is in use."):
         super().__init__(message)
+
+
+class DeviceNotFoundException(PulseInterfaceException):
+    def __init__(self, message: str = "The input device does not exist."):
+        super().__init__(message)
+
+
+class NoCacheDirectoryException(PulseInterfaceException):
+    def __init__(self, message: str = "Cannot determine a cache directory to remember the loaded modules in. "
+                                      "Set HOME or an absolute XDG_CACHE_HOME."):
+        super().__init__(message)
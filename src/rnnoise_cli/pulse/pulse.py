@@ -1,172 +1,287 @@
-import contextlib
-import importlib.resources
-import pickle
-from dataclasses import dataclass, field
+import atexit
+import functools
+import json
+import os
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple, TYPE_CHECKING
 
-import click
-import pulsectl
+from .exceptions import (DeviceNotFoundException, NoCacheDirectoryException, NotActivatedException,
+                         NoLoadedModulesException, RNNInUseException)
+from ..config import CACHE_PATH
 
-from .exceptions import *
+if TYPE_CHECKING:
+    import pulsectl
 
-CACHE_PATH = Path.home() / ".cache" / "rnnoise_cli"
-LOADED_MODULES_PATH = Path(CACHE_PATH) / "load_info.pickle"
+# `None` if there is no cache directory, then nothing can be loaded since it could not be unloaded later
+LOADED_MODULES_PATH: Optional[Path] = None if CACHE_PATH is None else CACHE_PATH / "load_info.json"
+# Latency of the loopback from the microphone to the RNNoise sink, in milliseconds
+DEFAULT_LATENCY_MSEC = 10
+# Last `LoadInfo` read or written, with the path, modification time and size of its file at the time
+_load_info_cache: Optional[Tuple[Tuple[str, int, int], 'LoadInfo']] = None
+
+
+@functools.lru_cache(maxsize=1)
+def _plugin_path() -> str:
+    """
+    Path to the RNNoise LADSPA plugin, resolved on first use.
+    """
+    import importlib.resources
+    with importlib.resources.path("rnnoise_cli.data", "librnnoise_ladspa.so") as plugin_path:
+        # The plugin is installed as a regular file, so the path stays valid after the context exits.
+        return str(plugin_path)
 
 
 @dataclass
 class LoadInfo:
     """
     Info on a loaded configuration that can be used to unload it.
-    This is pickled to be able to remember it between invocations of the application.
+    This is written to a JSON file to be able to remember it between invocations of the application.
     It has to be checked, since the plugin can be unloaded outside this application, e.g. by rebooting.
     """
-    device: pulsectl.PulseSourceInfo
+    device_name: str
     control: int
+    latency_msec: int = DEFAULT_LATENCY_MSEC
     modules: Dict[str, int] = field(default_factory=dict)
 
     @classmethod
-    def from_pickle(cls, pickle_path: Path = LOADED_MODULES_PATH) -> 'LoadInfo':
+    def from_json(cls, json_path: Optional[Path] = LOADED_MODULES_PATH) -> 'LoadInfo':
         """
+        The file is only read again if its modification time or size changed since the last call.
         Args:
-            pickle_path:
-                Path to a pickle file.
+            json_path:
+                Path to a JSON file.
         Raises:
             FileNotFoundError:
-                The path does not exist.
+                The path does not exist, or is `None`.
             ValueError:
                 The file is invalid.
         """
-        with open(pickle_path, "rb") as file:
-            result = pickle.load(file)
-        if not isinstance(result, cls):
+        global _load_info_cache
+        if json_path is None:
+            raise FileNotFoundError("No cache directory to read the load info from.")
+        st = json_path.stat()
+        key = (str(json_path), st.st_mtime_ns, st.st_size)
+        if _load_info_cache is not None and _load_info_cache[0] == key:
+            return _load_info_cache[1]
+
+        data = json.loads(json_path.read_text())
+        if not isinstance(data, dict):
+            raise ValueError
+        try:
+            info = cls(**data)
+        except TypeError:
+            raise ValueError
+        if not info._has_valid_types():
             raise ValueError
+        _load_info_cache = (key, info)
+        return info
 
-        return result
+    def _has_valid_types(self) -> bool:
+        def is_int(value) -> bool:
+            return isinstance(value, int) and not isinstance(value, bool)
 
-    def write_pickle(self, pickle_path: Path = LOADED_MODULES_PATH):
+        return isinstance(self.device_name, str) and is_int(self.control) and is_int(self.latency_msec) \
+            and isinstance(self.modules, dict) \
+            and all(isinstance(name, str) and is_int(index) for name, index in self.modules.items())
+
+    def write_json(self, json_path: Optional[Path] = LOADED_MODULES_PATH):
         """
+        The file is replaced atomically, so it is never left half written.
         Args:
-            pickle_path:
-                Path to a pickle file.
+            json_path:
+                Path to a JSON file, its parent directories are created if needed.
         Raises:
-            FileNotFoundError:
-                The path does not exist.
+            NoCacheDirectoryException:
+                `json_path` is `None`.
         """
-        pickle_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(LOADED_MODULES_PATH, 'wb') as file:
-            pickle.dump(self, file, protocol=pickle.HIGHEST_PROTOCOL)
+        global _load_info_cache
+        if json_path is None:
+            raise NoCacheDirectoryException()
+        import tempfile
+        json_path.parent.mkdir(parents=True, exist_ok=True)
+        # A unique temporary file, so concurrent invocations do not write to the same one
+        tmp_file = tempfile.NamedTemporaryFile("w", dir=json_path.parent, prefix=json_path.name + ".",
+                                               suffix=".tmp", delete=False)
+        try:
+            with tmp_file:
+                tmp_file.write(json.dumps(asdict(self)))
+            os.replace(tmp_file.name, json_path)
+        except BaseException:
+            Path(tmp_file.name).unlink(missing_ok=True)
+            raise
+        _load_info_cache = None
+
+    @staticmethod
+    def remove_json(json_path: Optional[Path] = LOADED_MODULES_PATH):
+        """
+        Remove the JSON file, if it exists.
+        Args:
+            json_path:
+                Path to a JSON file, nothing is removed if it is `None`.
+        """
+        global _load_info_cache
+        if json_path is not None:
+            json_path.unlink(missing_ok=True)
+        _load_info_cache = None
 
 
 class PulseInterface:
-    pulse = pulsectl.Pulse("rnnoise_cli")
+    _pulse: Optional['pulsectl.Pulse'] = None
     null_sink_name = "rnnoise_mic_denoised_out"
     ladspa_sink_name = "rnnoise_mic_raw_in"
     loopback_key = "loopback"
     remap_source_name = "rnnoise_denoised"
+    # Argument templates for the modules loaded by `load_modules`, filled from a single dict of parameters
+    _NULL_SINK_OPTS = (
+        "sink_name={null_sink} "
+        "rate={rate} "
+        "sink_properties=\"device.description='RNNoise Denoised Sink'\""
+    )
+    _LADSPA_SINK_OPTS = (
+        "sink_name={ladspa_sink} "
+        "sink_master={null_sink} "
+        "label=noise_suppressor_{channel_mode} "
+        "plugin=\"{plugin}\" "
+        "control={control} "
+        "sink_properties=\"device.description='RNNoise Raw Input Sink'\""
+    )
+    _LOOPBACK_OPTS = (
+        "source={mic} "
+        "sink={ladspa_sink} "
+        "channels={channels} "
+        "source_dont_move=true "
+        "sink_dont_move=true "
+        "latency_msec={latency_msec}"
+    )
+    _REMAP_SOURCE_OPTS = (
+        "master={null_sink}.monitor "
+        "source_name={remap_source} "
+        "channels={channels} "
+        "source_properties=\"device.description='RNNoise Denoised Microphone'\""
+    )
 
-    @staticmethod
-    def cli_command(command: List[str]):
+    @classmethod
+    def _get_pulse(cls) -> 'pulsectl.Pulse':
         """
-        For calling `pactl` commands as you would on the command line.
+        The pulse client, only connected when it is first needed and closed when the interpreter exits.
         """
-        with contextlib.closing(pulsectl.connect_to_cli()) as s:
-            for c in command:
-                s.write(c + "\n")
+        if cls._pulse is None:
+            import pulsectl
+            cls._pulse = pulsectl.Pulse("rnnoise_cli")
+            atexit.register(cls._close_pulse)
+        return cls._pulse
+
+    @classmethod
+    def _close_pulse(cls):
+        if cls._pulse is not None:
+            cls._pulse.close()
+            cls._pulse = None
 
     @classmethod
     def load_modules(cls,
-                     device: pulsectl.PulseSourceInfo,
+                     device: 'pulsectl.PulseSourceInfo',
                      control: int,
                      verbose: bool = False,
-                     set_default: bool = True) -> LoadInfo:
+                     set_default: bool = True,
+                     latency_msec: int = DEFAULT_LATENCY_MSEC) -> LoadInfo:
         """
         Args:
             device: Pulse source to use, e.g. as obtained by `PulseInterface.get_source_by_name()`.
             control: Control level for the RNNoise plugin.
             verbose: Whether to print extra stuff.
             set_default: Whether to select the new denoised output as the default output.
+            latency_msec: Latency of the loopback from the device to the RNNoise sink, in milliseconds.
         Returns:
             Info about what was loaded that can be used for unloading.
-            This is also pickled to the default location.
+            This is also written to the default location.
+        Raises:
+            NoCacheDirectoryException:
+                There is no cache directory to remember the loaded modules in, nothing was loaded.
+            pulsectl.PulseOperationFailed:
+                One of the modules failed to load, the ones loaded before it are unloaded again.
         """
+        if LOADED_MODULES_PATH is None:
+            raise NoCacheDirectoryException()
 
-        loaded = cls.get_loaded_modules()
+        loaded: Dict[str, int] = {}
 
-        mic_name = device.name
-        mic_rate = device.sample_spec.rate
         stereo = (device.channel_count == 2)
+        params = {
+            "null_sink": cls.null_sink_name,
+            "ladspa_sink": cls.ladspa_sink_name,
+            "remap_source": cls.remap_source_name,
+            "mic": device.name,
+            "rate": device.sample_spec.rate,
+            "channels": 2 if stereo else 1,
+            "channel_mode": "stereo" if stereo else "mono",
+            "plugin": _plugin_path(),
+            "control": control,
+            "latency_msec": latency_msec,
+        }
+
+        # Verbose output is written at once, also when loading fails halfway
+        messages: List[str] = []
+        try:
+            null_sink_opts = cls._NULL_SINK_OPTS.format_map(params)
+            loaded[cls.null_sink_name] = cls._get_pulse().module_load(
+                "module-null-sink", null_sink_opts)
+            messages.append(f"Loaded module-null-sink {cls.null_sink_name} "
+                            f"with index {loaded[cls.null_sink_name]} "
+                            f"and options: {null_sink_opts}")
+
+            ladspa_sink_opts = cls._LADSPA_SINK_OPTS.format_map(params)
+            loaded[cls.ladspa_sink_name] = cls._get_pulse().module_load(
+                "module-ladspa-sink", ladspa_sink_opts)
+            messages.append(f"Loaded module-ladspa-sink {cls.ladspa_sink_name} "
+                            f"with index {loaded[cls.ladspa_sink_name]} "
+                            f"and options: {ladspa_sink_opts}")
+
+            loopback_opts = cls._LOOPBACK_OPTS.format_map(params)
+            loaded[cls.loopback_key] = cls._get_pulse().module_load(
+                "module-loopback", loopback_opts)
+            messages.append(f"Loaded module-loopback "
+                            f"with index {loaded[cls.loopback_key]} "
+                            f"and options: {loopback_opts}")
+
+            remap_source_opts = cls._REMAP_SOURCE_OPTS.format_map(params)
+            loaded[cls.remap_source_name] = cls._get_pulse().module_load(
+                "module-remap-source", remap_source_opts)
+            messages.append(f"Loaded module-remap-source {cls.remap_source_name} "
+                            f"with index {loaded[cls.remap_source_name]} "
+                            f"and options: {remap_source_opts}")
+
+            if set_default:
+                cls._get_pulse().source_default_set(cls.remap_source_name)
+
+            load_info = LoadInfo(device_name=device.name, control=control, latency_msec=latency_msec,
+                                 modules=loaded)
+            load_info.write_json()
+        except BaseException:
+            # Don't leave modules behind that could not be unloaded without the load info
+            for name, index in reversed(list(loaded.items())):
+                try:
+                    cls._get_pulse().module_unload(index)
+                    messages.append(f"Unloaded module {name} ({index}) again.")
+                except Exception:
+                    # Best effort, the original error is the one to report.
+                    pass
+            raise
+        finally:
+            if verbose and messages:
+                import click
+                click.echo("\n".join(messages))
+            cls.clear_device_cache()
 
-        null_sink_opts = (
-            f"sink_name={cls.null_sink_name} "
-            f"rate={mic_rate} "
-            "sink_properties=\"device.description='RNNoise Denoised Sink'\""
-        )
-        loaded[cls.null_sink_name] = cls.pulse.module_load(
-            "module-null-sink", null_sink_opts)
-        if verbose:
-            click.echo(f"Loaded module-null-sink {cls.null_sink_name} "
-                       f"with index {loaded[cls.null_sink_name]} "
-                       f"and options: {null_sink_opts}")
-
-        with importlib.resources.path("rnnoise_cli.data", "librnnoise_ladspa.so") as plugin_path:
-            ladspa_sink_opts = (
-                f"sink_name={cls.ladspa_sink_name} "
-                f"sink_master={cls.null_sink_name} "
-                f"label=noise_suppressor_{'stereo' if stereo else 'mono'} "
-                f"plugin=\"{plugin_path}\" "
-                f"control={control} "
-                "sink_properties=\"device.description='RNNoise Raw Input Sink'\""
-            )
-        loaded[cls.ladspa_sink_name] = cls.pulse.module_load(
-            "module-ladspa-sink", ladspa_sink_opts)
-        if verbose:
-            click.echo(f"Loaded module-ladspa-sink {cls.ladspa_sink_name} "
-                       f"with index {loaded[cls.ladspa_sink_name]} "
-                       f"and options: {ladspa_sink_opts}")
-
-        loopback_opts = (
-            f"source={mic_name} "
-            f"sink={cls.ladspa_sink_name} "
-            f"channels={2 if stereo else 1} "
-            "source_dont_move=true "
-            "sink_dont_move=true "
-            "latency_msec=1"
-        )
-        loaded[cls.loopback_key] = cls.pulse.module_load(
-            "module-loopback", loopback_opts)
-        if verbose:
-            click.echo(f"Loaded module-loopback "
-                       f"with index {loaded[cls.loopback_key]} "
-                       f"and options: {loopback_opts}")
-
-        remap_source_opts = (
-            f"master={cls.null_sink_name}.monitor "
-            f"source_name={cls.remap_source_name} "
-            f"channels={2 if stereo else 1} "
-            "source_properties=\"device.description='RNNoise Denoised Microphone'\""
-        )
-        loaded[cls.remap_source_name] = cls.pulse.module_load(
-            "module-remap-source", remap_source_opts)
-        if verbose:
-            click.echo(f"Loaded module-remap-source {cls.remap_source_name} "
-                       f"with index {loaded[cls.remap_source_name]} "
-                       f"and options: {remap_source_opts}")
-
-        if set_default:
-            cls.pulse.source_default_set(cls.remap_source_name)
-
-        load_info = LoadInfo(device=device, control=control, modules=loaded)
-        load_info.write_pickle()
         return load_info
 
     @staticmethod
     def get_loaded_modules() -> Dict[str, int]:
         """
-        Get the loaded modules from the default pickle file.
+        Get the loaded modules from the default JSON file.
         """
         try:
-            return LoadInfo.from_pickle().modules
+            return LoadInfo.from_json().modules
         except (ValueError, FileNotFoundError):
             return {}
 
@@ -175,6 +290,7 @@ class PulseInterface:
         """
         Change the control level on a loaded configuration.
         I haven't found a stable way to do this without unloading and re-loading the module.
+        The device and latency of the loaded configuration are kept.
         Args:
             control:
                 The new control level.
@@ -186,6 +302,13 @@ class PulseInterface:
                 and most applications do not deal with that smoothly.
             set_default:
                 Passed as the `set_default` argument to `load_modules`.
+        Raises:
+            NotActivatedException:
+                The plugin is not loaded.
+            RNNInUseException:
+                An application is using the RNNoise output and `force` is not set.
+            DeviceNotFoundException:
+                The input device the plugin was activated with no longer exists.
         """
         not_activated_msg = "The plugin is not activated. Cannot change control level."
         if not cls.rnn_is_loaded():
@@ -196,46 +319,60 @@ class PulseInterface:
                                     "Not allowed to change control level without `force` argument.")
 
         try:
-            old_device = LoadInfo.from_pickle().device
+            old_info = LoadInfo.from_json()
         except (ValueError, FileNotFoundError):
             raise NotActivatedException(not_activated_msg)
 
+        try:
+            old_device = cls.get_source_by_name(old_info.device_name)
+        except ValueError:
+            raise DeviceNotFoundException(f"The input device \"{old_info.device_name}\" no longer exists. "
+                                          f"Cannot change control level, activate again to select a device.")
+
         cls.unload_modules(verbose)
-        cls.load_modules(old_device, control, verbose, set_default)
+        cls.load_modules(old_device, control, verbose, set_default, old_info.latency_msec)
 
     @classmethod
     def streams_using_rnnoise(cls) -> bool:
         """
         Whether some stream is using the RNNoise output.
         """
+        source_outputs = cls._get_pulse().source_output_list()
+        if not source_outputs:
+            # Nothing is recording, no need to look up the source.
+            return False
         try:
             index = cls.get_source_by_name(cls.remap_source_name).index
         except ValueError:
             return False
-        return any(s.source == index for s in cls.pulse.source_output_list())
+        return any(s.source == index for s in source_outputs)
 
-    @staticmethod
-    def unload_modules_all():
+    @classmethod
+    def unload_modules_all(cls):
         """
         Force unload by onloading all modules of the same types as those loaded by `load_modules`.
         This is very aggressive and likely to remove other stuff if you are using anything beyond the default
         pulseaudio setup.
         Use with care!
         """
-        LOADED_MODULES_PATH.unlink(missing_ok=True)
-        PulseInterface.cli_command(
-            [
-                "unload-module module-loopback",
-                "unload-module module-null-sink",
-                "unload-module module-ladspa-sink",
-                "unload-module module-remap-source",
-            ]
-        )
+        import pulsectl
+        LoadInfo.remove_json()
+        # Unload in this order, e.g. so the loopback stops feeding the sinks before they go away.
+        module_types = ["module-loopback", "module-null-sink", "module-ladspa-sink", "module-remap-source"]
+        modules = sorted((m for m in cls._get_pulse().module_list() if m.name in module_types),
+                         key=lambda m: module_types.index(m.name))
+        for module in modules:
+            try:
+                cls._get_pulse().module_unload(module.index)
+            except pulsectl.PulseOperationFailed:
+                # Already unloaded along with a module it depended on.
+                pass
+        cls.clear_device_cache()
 
     @classmethod
     def unload_modules(cls, verbose: bool = False, force: bool = False):
         """
-        Unloads all modules specified to be loaded in the default pickle file.
+        Unloads all modules specified to be loaded in the default JSON file.
         Args:
             verbose:
                 Whether to print extra stuff.
@@ -245,6 +382,7 @@ class PulseInterface:
             PulseInterfaceException:
                 `modules` is None and there is nothing to unload.
         """
+        import pulsectl
         if not force and cls.streams_using_rnnoise():
             raise RNNInUseException("The RNNoise plugin is being used by some application. "
                                     "Not allowed to unload without `force` argument.")
@@ -255,32 +393,52 @@ class PulseInterface:
             raise NoLoadedModulesException(
                 "No modules loaded, cannot unload modules.")
         else:
-            for name, index in modules.items():
-                try:
-                    cls.pulse.module_unload(index)
-                    if verbose:
-                        click.echo(f"Unloaded module {name} ({index}).")
-                except pulsectl.PulseOperationFailed:
-                    # The module was already unloaded for some reason.
-                    pass
-
-        LOADED_MODULES_PATH.unlink(missing_ok=True)
+            messages: List[str] = []
+            try:
+                for name, index in modules.items():
+                    try:
+                        cls._get_pulse().module_unload(index)
+                        messages.append(f"Unloaded module {name} ({index}).")
+                    except pulsectl.PulseOperationFailed:
+                        # The module was already unloaded for some reason.
+                        pass
+            finally:
+                if verbose and messages:
+                    import click
+                    click.echo("\n".join(messages))
+
+        LoadInfo.remove_json()
+        cls.clear_device_cache()
 
     @classmethod
-    def get_input_devices(cls) -> List[pulsectl.PulseSourceInfo]:
+    @functools.lru_cache(maxsize=1)
+    def get_input_devices(cls) -> List['pulsectl.PulseSourceInfo']:
         """
+        The result is cached until `clear_device_cache` is called.
         Returns:
             A list of the available input devices.
         """
-        return cls.pulse.source_list()
+        return cls._get_pulse().source_list()
 
     @classmethod
+    @functools.lru_cache(maxsize=1)
     def get_default_input_device(cls):
         """
+        The result is cached until `clear_device_cache` is called.
         Returns:
             The default input device.
         """
-        return cls.get_source_by_name(cls.pulse.server_info().default_source_name)
+        return cls.get_source_by_name(cls._get_pulse().server_info().default_source_name)
+
+    @classmethod
+    def clear_device_cache(cls):
+        """
+        Forget the cached source list, sources looked up by name and default input device.
+        Called whenever modules are (un)loaded, since that adds or removes sources.
+        """
+        cls.get_input_devices.cache_clear()
+        cls._find_source_by_name.cache_clear()
+        cls.get_default_input_device.cache_clear()
 
     @classmethod
     def get_source(cls, identifier: str):
@@ -293,18 +451,23 @@ class PulseInterface:
             The corresponding source if one with the given number or name exists.
             Otherwise, `None`.
         """
+        # Names are what's usually configured, try those first.
         try:
-            return PulseInterface.get_source_by_num(int(identifier))
+            return cls.get_source_by_name(identifier)
         except ValueError:
+            pass
+        if identifier.isdigit():
             try:
-                return PulseInterface.get_source_by_name(identifier)
+                return cls.get_source_by_num(int(identifier))
             except ValueError:
-                return None
+                pass
+        return None
 
     @classmethod
-    def get_source_by_name(cls, name: str) -> pulsectl.PulseSourceInfo:
+    def get_source_by_name(cls, name: str) -> 'pulsectl.PulseSourceInfo':
         """
         Get a source by its name.
+        The result, including a missing source, is cached until `clear_device_cache` is called.
         Args:
             name: The source name.
         Returns:
@@ -313,13 +476,25 @@ class PulseInterface:
             ValueError:
                 There is no source with this name.
         """
+        source = cls._find_source_by_name(name)
+        if source is None:
+            raise ValueError
+        return source
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def _find_source_by_name(cls, name: str) -> Optional['pulsectl.PulseSourceInfo']:
+        """
+        Like `get_source_by_name`, but returns `None` for a missing source so that is cached too.
+        """
+        import pulsectl
         try:
-            return cls.pulse.get_source_by_name(name)
+            return cls._get_pulse().get_source_by_name(name)
         except pulsectl.PulseIndexError:
-            raise ValueError
+            return None
 
     @classmethod
-    def get_source_by_num(cls, num: int):
+    def get_source_by_num(cls, num: int) -> 'pulsectl.PulseSourceInfo':
         """
         Get a source by its number.
         Args:
@@ -330,24 +505,26 @@ class PulseInterface:
             ValueError:
                 There is no source with this number.
         """
+        import pulsectl
         try:
-            return next(s for s in cls.pulse.source_list() if s.index == num)
-        except StopIteration:
+            return cls._get_pulse().source_info(num)
+        except pulsectl.PulseIndexError:
             raise ValueError
 
     @classmethod
     def rnn_is_loaded(cls):
         """
         Check whether the plugin is loaded.
-        This checks whether the pickle file is present,
-        but also checks if the modules are actually loaded, as e.g. a reboot will reset pulse.
+        This checks whether the JSON file is present,
+        but also checks if the denoised source actually exists, as e.g. a reboot will reset pulse.
         Returns:
             Whether the plugin seems to be loaded.
         """
-        if cls.get_loaded_modules():
-            # Check if any of the modules are actually present
-            rnn_names = [cls.null_sink_name, cls.ladspa_sink_name,
-                         cls.loopback_key, cls.remap_source_name]
-            return any(s.name in rnn_names for s in cls.pulse.source_list())
-        else:
+        if not cls.get_loaded_modules():
+            return False
+        # Of the loaded modules, only the remapped source shows up as a source under one of our names.
+        try:
+            cls.get_source_by_name(cls.remap_source_name)
+        except ValueError:
             return False
+        return True
@@ -1,8 +1,14 @@
 import unittest
 from collections import namedtuple
 from unittest.mock import patch
+import click
 from click.testing import CliRunner
+from rnnoise_cli import pretty
 from rnnoise_cli.commands import rnnoise
+from rnnoise_cli.config import DictConfig
+from rnnoise_cli.pulse import LoadInfo, PulseInterface
+from rnnoise_cli.pulse.exceptions import (DeviceNotFoundException, NoLoadedModulesException,
+                                          NotActivatedException)
 
 
 class TestList(unittest.TestCase):
@@ -20,7 +26,7 @@ class TestList(unittest.TestCase):
         )
         return [test_device_1, test_device_2]
 
-    @patch("rnnoise_cli.commands.PulseInterface.get_input_devices")
+    @patch("rnnoise_cli.pulse.PulseInterface.get_input_devices")
     def test_list_formatting(self, get_input_devices):
         get_input_devices.return_value = self.get_test_devices()
         result = self.runner.invoke(rnnoise, "list")
@@ -31,5 +37,158 @@ class TestList(unittest.TestCase):
         )
 
 
+class TestHelp(unittest.TestCase):
+
+    def setUp(self):
+        self.runner = CliRunner()
+
+    def test_subcommand_help(self):
+        for args in ([], ["activate"], ["deactivate"], ["control"], ["control", "get"], ["control", "set"],
+                     ["list"], ["license"], ["status"]):
+            with self.subTest(args=args):
+                result = self.runner.invoke(rnnoise, args + ["--help"])
+                assert result.exit_code == 0
+                assert result.output.startswith("Usage: rnnoise")
+
+    def test_license(self):
+        result = self.runner.invoke(rnnoise, "license")
+        assert result.exit_code == 0
+        assert "noise-suppression-for-voice" in result.output
+
+
+class CommandTestCase(unittest.TestCase):
+    """
+    Runs commands with an empty config and without touching pulse or the load info file.
+    """
+
+    def setUp(self):
+        self.runner = CliRunner()
+        self.patch("rnnoise_cli.commands.load_config", return_value=DictConfig({}))
+        self.load_info = LoadInfo(device_name="test.device", control=70, latency_msec=25, modules={"loopback": 3})
+        self.from_json = self.patch_object(LoadInfo, "from_json", return_value=self.load_info)
+
+    def patch(self, target: str, **kwargs):
+        p = patch(target, **kwargs)
+        self.addCleanup(p.stop)
+        return p.start()
+
+    def patch_object(self, cls, name: str, **kwargs):
+        p = patch.object(cls, name, **kwargs)
+        self.addCleanup(p.stop)
+        return p.start()
+
+
+class TestStatus(CommandTestCase):
+
+    def test_loaded(self):
+        self.patch_object(PulseInterface, "rnn_is_loaded", return_value=True)
+        result = self.runner.invoke(rnnoise, "status")
+        assert result.exit_code == 0
+        assert result.output.startswith("The plugin is loaded.\n")
+        assert "test.device" in result.output
+        assert "25 ms" in result.output
+
+    def test_not_loaded(self):
+        self.patch_object(PulseInterface, "rnn_is_loaded", return_value=False)
+        result = self.runner.invoke(rnnoise, "status")
+        assert result.exit_code == 0
+        assert result.output == "The plugin is not loaded.\n"
+        self.from_json.assert_not_called()
+
+
+class TestDeactivate(CommandTestCase):
+
+    def test_deactivate(self):
+        unload_modules = self.patch_object(PulseInterface, "unload_modules")
+        result = self.runner.invoke(rnnoise, "deactivate")
+        assert result.exit_code == 0
+        assert result.output == "Deactivated!\n"
+        unload_modules.assert_called_once_with(verbose=False, force=False)
+
+    def test_nothing_loaded(self):
+        self.patch_object(PulseInterface, "unload_modules", side_effect=NoLoadedModulesException)
+        result = self.runner.invoke(rnnoise, "deactivate")
+        assert result.exit_code == 0
+        assert result.output == click.unstyle(pretty.NO_LOADED_MODULES) + "\n"
+
+    def test_force_unload_all(self):
+        unload_modules_all = self.patch_object(PulseInterface, "unload_modules_all")
+        result = self.runner.invoke(rnnoise, ["deactivate", "--force-unload-all"])
+        assert result.exit_code == 0
+        unload_modules_all.assert_called_once_with()
+
+
+class TestControl(CommandTestCase):
+
+    def test_get(self):
+        result = self.runner.invoke(rnnoise, ["control", "get"])
+        assert result.exit_code == 0
+        assert result.output == "70\n"
+
+    def test_set(self):
+        change_control_level = self.patch_object(PulseInterface, "change_control_level")
+        result = self.runner.invoke(rnnoise, ["control", "set", "30"])
+        assert result.exit_code == 0
+        change_control_level.assert_called_once_with(30, False, False, False)
+
+    def test_set_not_activated(self):
+        self.patch_object(PulseInterface, "change_control_level", side_effect=NotActivatedException)
+        result = self.runner.invoke(rnnoise, ["control", "set", "30"])
+        assert result.exit_code == 0
+        assert result.output == "Plugin is not activated, cannot change control level.\n"
+
+    def test_set_missing_device(self):
+        self.patch_object(PulseInterface, "change_control_level",
+                          side_effect=DeviceNotFoundException("test.device no longer exists"))
+        result = self.runner.invoke(rnnoise, ["control", "set", "30"])
+        assert result.exit_code == 0
+        assert result.output == "test.device no longer exists\n"
+
+
+class TestActivate(CommandTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.device = namedtuple("obj", ["index", "name"])(0, "test.device")
+        self.patch_object(PulseInterface, "rnn_is_loaded", return_value=False)
+        self.patch_object(PulseInterface, "get_default_input_device", return_value=self.device)
+        self.load_modules = self.patch_object(PulseInterface, "load_modules")
+
+    def test_defaults(self):
+        result = self.runner.invoke(rnnoise, ["activate", "--no-prompt"])
+        assert result.exit_code == 0
+        assert result.output == "Activated!\n"
+        self.load_modules.assert_called_once_with(self.device, 50, False, True, 10)
+
+    def test_options(self):
+        result = self.runner.invoke(rnnoise, ["activate", "--no-prompt", "--control", "70", "--latency", "25",
+                                              "--no-set-default"])
+        assert result.exit_code == 0
+        self.load_modules.assert_called_once_with(self.device, 70, False, False, 25)
+
+    def test_latency_out_of_range(self):
+        for latency in ("0", "30001"):
+            with self.subTest(latency=latency):
+                result = self.runner.invoke(rnnoise, ["activate", "--no-prompt", "--latency", latency])
+                assert result.exit_code == 2
+                assert "Invalid value for '--latency'" in result.output
+        self.load_modules.assert_not_called()
+
+    def test_config_latency_out_of_range(self):
+        config = DictConfig({"activate": {"latency": "30001"}})
+        with patch("rnnoise_cli.commands.load_config", return_value=config):
+            result = self.runner.invoke(rnnoise, ["activate", "--no-prompt"])
+        assert result.exit_code == 1
+        assert "Invalid latency in the config file: 30001." in result.output
+        self.load_modules.assert_not_called()
+
+    def test_config(self):
+        config = DictConfig({"activate": {"control": "70", "latency": "25"}})
+        with patch("rnnoise_cli.commands.load_config", return_value=config):
+            result = self.runner.invoke(rnnoise, ["activate", "--no-prompt"])
+        assert result.exit_code == 0
+        self.load_modules.assert_called_once_with(self.device, 70, False, True, 25)
+
+
 if __name__ == '__main__':
     unittest.main()
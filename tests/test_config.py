@@ -0,0 +1,83 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from rnnoise_cli import config
+
+
+class TestLoadConfig(unittest.TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp = Path(tmp_dir.name)
+        self.config_path = self.tmp / "rnnoise_cli" / "rnnoise_cli.conf"
+        env_patch = patch.dict(os.environ, {"XDG_CONFIG_HOME": str(self.tmp)})
+        cache_patch = patch.object(config, "CONFIG_CACHE_PATH", self.tmp / "cache" / "config.json")
+        for p in (env_patch, cache_patch):
+            p.start()
+            self.addCleanup(p.stop)
+
+    def write_config(self, text: str):
+        self.config_path.parent.mkdir(parents=True, exist_ok=True)
+        self.config_path.write_text(text)
+
+    def test_no_config_file(self):
+        result = config.load_config()
+        assert result.get("activate", "device") is None
+        assert result.getint("activate", "control", fallback=50) == 50
+        assert not config.CONFIG_CACHE_PATH.exists()
+
+    def test_reads_config_file(self):
+        self.write_config("[activate]\ndevice = test.device\ncontrol = 70\n")
+        result = config.load_config()
+        assert result.get("activate", "device") == "test.device"
+        assert result.getint("activate", "control", fallback=50) == 70
+
+    def test_cache_hit_skips_parsing(self):
+        self.write_config("[activate]\ncontrol = 70\n")
+        config.load_config()
+        with patch.object(config, "_parse_config") as parse_config:
+            result = config.load_config()
+        parse_config.assert_not_called()
+        assert result.getint("activate", "control") == 70
+
+    def test_modified_config_is_parsed_again(self):
+        self.write_config("[activate]\ncontrol = 70\n")
+        config.load_config()
+        self.write_config("[activate]\ncontrol = 30\n")
+        stat = self.config_path.stat()
+        os.utime(self.config_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        assert config.load_config().getint("activate", "control") == 30
+
+    def test_resized_config_with_same_mtime_is_parsed_again(self):
+        self.write_config("[activate]\ncontrol = 70\n")
+        mtime_ns = self.config_path.stat().st_mtime_ns
+        config.load_config()
+        self.write_config("[activate]\ncontrol = 100\n")
+        os.utime(self.config_path, ns=(mtime_ns, mtime_ns))
+        assert config.load_config().getint("activate", "control") == 100
+
+    def test_invalid_cache_is_ignored(self):
+        self.write_config("[activate]\ncontrol = 70\n")
+        config.load_config()
+        cache = json.loads(config.CONFIG_CACHE_PATH.read_text())
+        cache["sections"] = []
+        config.CONFIG_CACHE_PATH.write_text(json.dumps(cache))
+        assert config.load_config().getint("activate", "control") == 70
+
+    def test_relative_xdg_config_home_is_ignored(self):
+        with patch.dict(os.environ, {"XDG_CONFIG_HOME": "relative/config"}):
+            assert config.config_file_path() == config.HOME / ".config" / "rnnoise_cli" / "rnnoise_cli.conf"
+
+    def test_no_home_directory(self):
+        with patch.dict(os.environ, {"XDG_CONFIG_HOME": ""}), patch.object(config, "HOME", None):
+            assert config.config_file_path() is None
+            assert config.load_config().get("activate", "device") is None
+
+
+if __name__ == '__main__':
+    unittest.main()
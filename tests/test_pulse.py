@@ -0,0 +1,151 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from rnnoise_cli.pulse import LoadInfo, PulseInterface, pulse
+from rnnoise_cli.pulse.exceptions import DeviceNotFoundException, NoCacheDirectoryException
+
+
+class TestLoadInfo(unittest.TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.json_path = Path(tmp_dir.name) / "cache" / "load_info.json"
+
+    def test_round_trip(self):
+        info = LoadInfo(device_name="test.device", control=70, modules={"loopback": 3})
+        info.write_json(self.json_path)
+        assert LoadInfo.from_json(self.json_path) == info
+
+    def test_invalid_file(self):
+        self.json_path.parent.mkdir()
+        for content in ('[]',
+                        '{"control": 50}',
+                        '{"device_name": "x", "control": "50"}',
+                        '{"device_name": "x", "control": 50, "modules": [1, 2]}',
+                        '{"device_name": "x", "control": 50, "modules": {"loopback": "3"}}'):
+            with self.subTest(content=content):
+                self.json_path.write_text(content)
+                with self.assertRaises(ValueError):
+                    LoadInfo.from_json(self.json_path)
+
+    def test_failed_write_leaves_no_temporary_file(self):
+        LoadInfo(device_name="test.device", control=70).write_json(self.json_path)
+        with patch("os.replace", side_effect=OSError), self.assertRaises(OSError):
+            LoadInfo(device_name="test.device", control=30).write_json(self.json_path)
+        assert [p.name for p in self.json_path.parent.iterdir()] == ["load_info.json"]
+        assert LoadInfo.from_json(self.json_path).control == 70
+
+    def test_unchanged_file_is_not_read_again(self):
+        LoadInfo(device_name="test.device", control=70).write_json(self.json_path)
+        first = LoadInfo.from_json(self.json_path)
+        with patch.object(Path, "read_text") as read_text:
+            assert LoadInfo.from_json(self.json_path) is first
+        read_text.assert_not_called()
+
+    def test_rewritten_file_is_read_again(self):
+        LoadInfo(device_name="test.device", control=70).write_json(self.json_path)
+        LoadInfo.from_json(self.json_path)
+        LoadInfo(device_name="test.device", control=30).write_json(self.json_path)
+        assert LoadInfo.from_json(self.json_path).control == 30
+
+    def test_removed_file(self):
+        LoadInfo(device_name="test.device", control=70).write_json(self.json_path)
+        LoadInfo.from_json(self.json_path)
+        LoadInfo.remove_json(self.json_path)
+        with self.assertRaises(FileNotFoundError):
+            LoadInfo.from_json(self.json_path)
+
+    def test_no_cache_directory(self):
+        with self.assertRaises(FileNotFoundError):
+            LoadInfo.from_json(None)
+        with self.assertRaises(NoCacheDirectoryException):
+            LoadInfo(device_name="test.device", control=70).write_json(None)
+        LoadInfo.remove_json(None)
+
+
+class TestLoadModules(unittest.TestCase):
+
+    @patch.object(LoadInfo, "write_json")
+    @patch.object(PulseInterface, "_get_pulse")
+    def test_loopback_latency(self, get_pulse, _write_json):
+        get_pulse.return_value.module_load.return_value = 1
+        device = Mock(channel_count=1, sample_spec=Mock(rate=48000))
+        device.name = "test.device"
+        info = PulseInterface.load_modules(device, 50, latency_msec=25)
+        loopback_opts = dict(c.args for c in get_pulse.return_value.module_load.call_args_list)["module-loopback"]
+        assert "latency_msec=25" in loopback_opts.split()
+        assert info.latency_msec == 25
+
+    @patch.object(LoadInfo, "write_json")
+    @patch.object(PulseInterface, "_get_pulse")
+    def test_failed_load_unloads_loaded_modules(self, get_pulse, write_json):
+        # The loopback, the third module, fails to load.
+        get_pulse.return_value.module_load.side_effect = [1, 2, RuntimeError]
+        device = Mock(channel_count=1, sample_spec=Mock(rate=48000))
+        device.name = "test.device"
+        with self.assertRaises(RuntimeError):
+            PulseInterface.load_modules(device, 50)
+        assert [c.args for c in get_pulse.return_value.module_unload.call_args_list] == [(2,), (1,)]
+        write_json.assert_not_called()
+
+    @patch.object(PulseInterface, "_get_pulse")
+    def test_no_cache_directory(self, get_pulse):
+        with patch.object(pulse, "LOADED_MODULES_PATH", None), self.assertRaises(NoCacheDirectoryException):
+            PulseInterface.load_modules(Mock(), 50)
+        get_pulse.assert_not_called()
+
+
+class TestDeviceCache(unittest.TestCase):
+
+    def setUp(self):
+        PulseInterface.clear_device_cache()
+        self.addCleanup(PulseInterface.clear_device_cache)
+        get_pulse_patch = patch.object(PulseInterface, "_get_pulse")
+        self.pulse = get_pulse_patch.start().return_value
+        self.addCleanup(get_pulse_patch.stop)
+
+    def test_input_devices_cached_until_cleared(self):
+        for _ in range(2):
+            assert PulseInterface.get_input_devices() is self.pulse.source_list.return_value
+        assert self.pulse.source_list.call_count == 1
+
+        PulseInterface.clear_device_cache()
+        PulseInterface.get_input_devices()
+        assert self.pulse.source_list.call_count == 2
+
+
+class TestChangeControlLevel(unittest.TestCase):
+
+    def setUp(self):
+        for name, value in (("rnn_is_loaded", True), ("streams_using_rnnoise", False)):
+            p = patch.object(PulseInterface, name, return_value=value)
+            p.start()
+            self.addCleanup(p.stop)
+        info = LoadInfo(device_name="test.device", control=50, latency_msec=25)
+        from_json_patch = patch.object(LoadInfo, "from_json", return_value=info)
+        from_json_patch.start()
+        self.addCleanup(from_json_patch.stop)
+
+    @patch.object(PulseInterface, "load_modules")
+    @patch.object(PulseInterface, "unload_modules")
+    @patch.object(PulseInterface, "get_source_by_name", side_effect=ValueError)
+    def test_missing_device(self, _get_source_by_name, unload_modules, load_modules):
+        with self.assertRaises(DeviceNotFoundException) as cm:
+            PulseInterface.change_control_level(70)
+        assert "test.device" in cm.exception.message
+        unload_modules.assert_not_called()
+        load_modules.assert_not_called()
+
+    @patch.object(PulseInterface, "load_modules")
+    @patch.object(PulseInterface, "unload_modules")
+    @patch.object(PulseInterface, "get_source_by_name")
+    def test_keeps_latency(self, get_source_by_name, _unload_modules, load_modules):
+        PulseInterface.change_control_level(70)
+        load_modules.assert_called_once_with(get_source_by_name.return_value, 70, False, False, 25)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,4 @@
-from typing import List, TextIO
+from typing import List
 
 
 class PulseObject:
@@ -25,6 +25,12 @@ class PulseSourceOutputInfo(PulseObject):
     source: int
 
 
+class PulseModuleInfo(PulseObject):
+    index: int
+    name: str
+    argument: str
+
+
 class PulseServerInfo(PulseObject):
     default_source_name: str
 
@@ -44,20 +50,22 @@ class PulseOperationFailed(PulseError):
 class Pulse:
     def __init__(self, name: str) -> None: ...
 
+    def close(self) -> None: ...
+
     def server_info(self) -> PulseServerInfo: ...
 
     def module_load(self, name: str, args: str) -> int: ...
 
     def module_unload(self, index: int) -> None: ...
 
+    def module_list(self) -> List[PulseModuleInfo]: ...
+
     def source_default_set(self, name: str) -> None: ...
 
     def get_source_by_name(self, name: str) -> PulseSourceInfo: ...
 
     def source_list(self) -> List[PulseSourceInfo]: ...
 
-    def source_output_list(self) -> List[PulseSourceOutputInfo]: ...
-
+    def source_info(self, index: int) -> PulseSourceInfo: ...
 
-def connect_to_cli() -> TextIO:
-    ...
+    def source_output_list(self) -> List[PulseSourceOutputInfo]: ...